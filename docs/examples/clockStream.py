@@ -0,0 +1,13 @@
+from soundprism.signal import *
+
+# stream a 50Hz pulse with 10% width in blocks, constant memory
+clock = clockStream(frequency=50, pulseWidth=0.1)
+block = clock.read(512)
+
+# steer the thrust, applied at the next period boundary
+clock.set(pulseWidth=0.15)
+block = clock.read(512)
+
+# retune, the running period is finished first
+clock.set(frequency=400)
+block = clock.read(512)
@@ -0,0 +1,13 @@
+from soundprism.signal import *
+from soundprism.vst import keyBoard
+from soundprism import midi
+
+# render a single file through a baked keyboard
+piano = keyBoard()
+piano.applyGenerator(generator.sine)
+midi.render('song.mid', 'song.wav', piano)
+
+# render a library across all cores, the generator must be picklable
+if __name__ == '__main__':
+    report = midi.batch(['a.mid', 'b.mid'], 'renders', generator.sine)
+    print(f"{report['throughput']:.1f} s of audio per second")
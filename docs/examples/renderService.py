@@ -0,0 +1,20 @@
+from soundprism.service import client, fetch, serve
+from multiprocessing import Process
+
+# run the daemon, it keeps baked instruments warm between jobs
+daemon = Process(target=serve, args=('/tmp/soundprism.sock',), kwargs={'workers': 4})
+daemon.start()
+
+# submit a score, lower priority numbers are rendered first
+render = client('/tmp/soundprism.sock')
+job = {
+    'generator': [['sine', 1, 1], ['saw', 1.5, 0.3]],
+    'score': [[0, 0.5, 'C4', 100], [0.5, 0.5, 'E4', 100]],
+    'format': 'shm'
+}
+id = render.submit(job, priority=0)
+signal = fetch(render.result(id)['result'])
+render.release(id) # frees the shared memory of the job
+print(render.metrics())
+
+render.shutdown()
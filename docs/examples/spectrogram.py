@@ -0,0 +1,10 @@
+from soundprism.signal import *
+from soundprism import spectral
+
+# bake a chirp-like tone and plot its spectrogram
+t = time.line(4)
+signal = generator.sine(220 + 110 * t, t)
+spectral.plot(signal, frameSize=2048, hopSize=512)
+
+# round trip through the streaming stft
+reconstructed = spectral.istft(spectral.stft(signal), length=len(signal))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+'''
+Audio Backend Module
+'''
+
+import numpy as np
+import threading
+from time import perf_counter, sleep
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    # no sounddevice package or no PortAudio library (e.g. headless servers)
+    sd = None
+
+
+class soundDeviceBackend:
+
+    '''
+    Plays signals on the sound card via sounddevice.
+    '''
+
+    def __init__ (self):
+
+        if sd is None:
+            raise RuntimeError('sounddevice is not available on this system.')
+
+    def play (self, signal, sampleRate, blocking=False):
+
+        sd.play(np.array(signal), sampleRate, blocking=blocking)
+
+    def setDevice (self, id):
+
+        sd.default.device = int(id)
+
+    def setRate (self, sampleRate):
+
+        sd.default.samplerate = sampleRate
+
+    def showDevices (self):
+
+        return sd.query_devices()
+
+    def stop (self):
+
+        sd.stop()
+
+    def wait (self):
+
+        sd.wait()
+
+
+
+class nullBackend:
+
+    '''
+    Headless backend which consumes signals block by block and records
+    what was played. With realtime=True every block is held back until
+    its deadline on a simulated output clock, otherwise blocks are
+    consumed as fast as possible. Deadline, latency and throughput
+    figures are collected in stats.
+    '''
+
+    def __init__ (self, realtime=True, blockSize=512, record=True, callback=None):
+
+        self.realtime = realtime
+        self.blockSize = blockSize
+        self.record = record
+        self.callback = callback
+        self.device = 0
+        self.sampleRate = None
+        self.played = []
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.resetStats()
+
+    def play (self, signal, sampleRate, blocking=False):
+
+        # like sounddevice, a new playback replaces the running one
+        self.stop()
+        signal = np.array(signal)
+        requested = perf_counter()
+        if blocking:
+            self.consume(signal, sampleRate, requested)
+        else:
+            self.thread = threading.Thread(target=self.consume, args=(signal, sampleRate, requested), daemon=True)
+            self.thread.start()
+
+    def consume (self, signal, sampleRate, requested):
+
+        blockDuration = self.blockSize / sampleRate
+        blocks = []
+        start = perf_counter()
+        self.stats['latency'].append(start - requested)
+
+        for i in range(0, signal.shape[0], self.blockSize):
+            if self.stopEvent.is_set():
+                break
+            block = signal[i:i+self.blockSize]
+
+            # block i has to be handed out before its slot on the output clock ends
+            if self.realtime:
+                deadline = start + (i // self.blockSize + 1) * blockDuration
+                wait = deadline - blockDuration - perf_counter()
+                if wait > 0:
+                    sleep(wait)
+
+            if self.callback is not None:
+                self.callback(block)
+            if self.record:
+                blocks.append(block)
+
+            if self.realtime:
+                lateness = perf_counter() - deadline
+                if lateness > 0:
+                    self.stats['underruns'] += 1
+                self.stats['maxLateness'] = max(self.stats['maxLateness'], lateness)
+
+            self.stats['blocks'] += 1
+            self.stats['samples'] += block.shape[0]
+
+        self.stats['seconds'] += perf_counter() - start
+        if self.record:
+            self.played.append(np.concatenate(blocks) if blocks else signal[:0])
+
+    def resetStats (self):
+
+        self.stats = {
+            'blocks': 0,
+            'samples': 0,
+            'seconds': 0.,
+            'latency': [],
+            'underruns': 0,
+            'maxLateness': 0.
+        }
+
+    def throughput (self):
+
+        '''
+        Returns consumed samples per wall clock second.
+        '''
+
+        if self.stats['seconds'] == 0:
+            return 0.
+        return self.stats['samples'] / self.stats['seconds']
+
+    def setDevice (self, id):
+
+        self.device = int(id)
+
+    def setRate (self, sampleRate):
+
+        self.sampleRate = sampleRate
+
+    def showDevices (self):
+
+        return [{'name': 'null', 'index': 0}]
+
+    def stop (self):
+
+        if self.thread is not None and self.thread.is_alive():
+            self.stopEvent.set()
+            self.thread.join()
+        self.thread = None
+        self.stopEvent.clear()
+
+    def wait (self):
+
+        if self.thread is not None:
+            self.thread.join()
+
+
+
+def default ():
+
+    '''
+    Returns the sounddevice backend if there is an output device,
+    otherwise the null backend.
+    '''
+
+    if sd is None:
+        return nullBackend()
+    try:
+        sd.query_devices(kind='output')
+    except Exception:
+        # PortAudio without any output device, e.g. headless servers
+        return nullBackend()
+    return soundDeviceBackend()
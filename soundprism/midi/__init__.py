@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+'''
+MIDI Module
+'''
+
+import numpy as np
+import os
+import wave
+from collections import namedtuple
+from multiprocessing import Pool
+from pathlib import Path
+from time import perf_counter
+from soundprism.signal import time
+from soundprism.vst import keyBoard
+
+
+# start and duration in seconds, tone as keyBoard tone name
+note = namedtuple('note', ['start', 'duration', 'tone', 'velocity', 'channel'])
+
+names = ["C{}", "C{}#", "D{}", "D{}#", "E{}", "F{}", "F{}#", "G{}", "G{}#", "A{}", "A{}#", "B{}"]
+
+
+class smf:
+
+    '''
+    Standard MIDI file (format 0 and 1) reader.
+    '''
+
+    def readVariableLength (data, pos):
+
+        value = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value = (value << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                return value, pos
+
+    def readChunks (data):
+
+        pos = 0
+        while pos + 8 <= len(data):
+            kind = data[pos:pos+4]
+            length = int.from_bytes(data[pos+4:pos+8], 'big')
+            yield kind, data[pos+8:pos+8+length]
+            pos += 8 + length
+
+    def readTrack (data):
+
+        '''
+        Returns a list of (tick, kind, channel, a, b) events in absolute ticks,
+        kind being 'on', 'off' or 'tempo' (a holds microseconds per quarter).
+        '''
+
+        events = []
+        pos, tick, status = 0, 0, None
+        while pos < len(data):
+            delta, pos = smf.readVariableLength(data, pos)
+            tick += delta
+            byte = data[pos]
+            if byte & 0x80:
+                status = byte
+                pos += 1
+            elif status is None:
+                raise ValueError('running status without a preceding status byte.')
+
+            # meta events
+            if status == 0xFF:
+                kind = data[pos]
+                length, pos = smf.readVariableLength(data, pos + 1)
+                if kind == 0x51:
+                    events.append((tick, 'tempo', 0, int.from_bytes(data[pos:pos+3], 'big'), 0))
+                pos += length
+                status = None
+                if kind == 0x2F:
+                    break
+                continue
+
+            # system exclusive events
+            if status in (0xF0, 0xF7):
+                length, pos = smf.readVariableLength(data, pos)
+                pos += length
+                status = None
+                continue
+
+            kind, channel = status & 0xF0, status & 0x0F
+            if kind in (0xC0, 0xD0):
+                pos += 1
+                continue
+            a, b = data[pos], data[pos+1]
+            pos += 2
+            if kind == 0x90 and b > 0:
+                events.append((tick, 'on', channel, a, b))
+            elif kind == 0x80 or kind == 0x90:
+                events.append((tick, 'off', channel, a, b))
+
+        return events
+
+    def read (path):
+
+        '''
+        Parses a file (path or bytes) and returns the notes sorted by start,
+        note numbers are kept in the tone field.
+        '''
+
+        data = bytes(path) if isinstance(path, (bytes, bytearray)) else Path(path).read_bytes()
+        chunks = list(smf.readChunks(data))
+        if not chunks or chunks[0][0] != b'MThd':
+            raise ValueError('not a standard MIDI file.')
+        header = chunks[0][1]
+        division = int.from_bytes(header[4:6], 'big')
+
+        events = []
+        for kind, body in chunks[1:]:
+            if kind == b'MTrk':
+                events.extend(smf.readTrack(body))
+        events.sort(key=lambda e: e[0])
+
+        # convert ticks to seconds along the tempo map
+        if division & 0x8000:
+            fps = 256 - (division >> 8)
+            secondsPerTick = lambda tempo: 1 / (fps * (division & 0xFF))
+        else:
+            secondsPerTick = lambda tempo: tempo * 1e-6 / division
+        tempo, lastTick, seconds = 500000, 0, 0.
+        pending, notes = {}, []
+        for tick, kind, channel, a, b in events:
+            seconds += (tick - lastTick) * secondsPerTick(tempo)
+            lastTick = tick
+            if kind == 'tempo':
+                tempo = a
+            elif kind == 'on':
+                pending.setdefault((channel, a), []).append((seconds, b))
+            elif pending.get((channel, a)):
+                start, velocity = pending[(channel, a)].pop(0)
+                notes.append(note(start, seconds - start, a, velocity, channel))
+
+        notes.sort(key=lambda n: n.start)
+        return notes
+
+
+
+# ==== global methods ====
+def toneName (number, keyboard=None):
+
+    '''
+    Maps a MIDI note number to a keyBoard tone name. If a keyboard is
+    provided, notes outside its baked range are folded by octaves into it.
+    Returns None if no key is available.
+    '''
+
+    octave, index = number // 12 - 1, number % 12
+    name = names[index].format(octave)
+    if keyboard is None:
+        return name
+    levels = [int(tone[1]) for tone in keyboard.toneRate if tone[0] == names[index][0] and tone[2:] == names[index][3:]]
+    if not levels:
+        return None
+    octave = min(max(octave, min(levels)), max(levels))
+    name = names[index].format(octave)
+    return name if name in keyboard.toneRate else None
+
+def load (path, keyboard=None, skipDrums=True):
+
+    '''
+    Returns the notes of a MIDI file with tone names mapped onto the keyboard.
+    '''
+
+    notes = []
+    for n in smf.read(path):
+        if skipDrums and n.channel == 9:
+            continue
+        tone = toneName(n.tone, keyboard)
+        if tone is not None:
+            notes.append(n._replace(tone=tone))
+    return notes
+
+def length (notes, release=0.01, duration=None):
+
+    '''
+    Returns the number of samples mix will produce.
+    '''
+
+    rate = time.sampleRate
+    if duration is not None:
+        return int(duration * rate)
+    releaseSamples = max(1, int(release * rate))
+    total = 0
+    for n in notes:
+        total = max(total, int((n.start + n.duration) * rate) + releaseSamples)
+    return total
+
+def mix (notes, keyboard, blockSize=8192, gain=0.5, release=0.01, duration=None):
+
+    '''
+    Mixes notes through the baked tones of a keyboard and yields blocks of
+    at most blockSize samples. Only one block and the active voices are
+    held in memory, the yielded block is reused for the next one.
+    The length follows the notes unless a duration in seconds is given.
+    '''
+
+    rate = time.sampleRate
+    releaseSamples = max(1, int(release * rate))
+    block = np.zeros(blockSize, dtype=np.float64)
+
+    # voices are (first sample, last sample, baked tone, gain)
+    voices, nextNote = [], 0
+    total = length(notes, release, duration)
+
+    for b0 in range(0, total, blockSize):
+        b1 = min(b0 + blockSize, total)
+
+        # start the notes beginning in this block
+        while nextNote < len(notes) and int(notes[nextNote].start * rate) < b1:
+            n = notes[nextNote]
+            tone = keyboard.keyTones[n.tone]
+            first = int(n.start * rate)
+            last = min(first + int(n.duration * rate) + releaseSamples, first + tone.shape[0])
+            voices.append((first, last, tone, gain * keyboard.volume * n.velocity / 127))
+            nextNote += 1
+
+        # mix the active voices
+        out = block[:b1 - b0]
+        out[:] = 0
+        alive = []
+        for first, last, tone, g in voices:
+            lo, hi = max(first, b0), min(last, b1)
+            if lo < hi:
+                segment = tone[lo - first:hi - first] * g
+                if hi > last - releaseSamples:
+                    segment *= np.clip((last - np.arange(lo, hi)) / releaseSamples, 0, 1)
+                out[lo - b0:hi - b0] += segment
+            if last > b1:
+                alive.append((first, last, tone, g))
+        voices = alive
+
+        yield out
+
+def write (blocks, outPath):
+
+    '''
+    Writes float blocks as a 16-bit mono wav file, returns the length in seconds.
+    '''
+
+    samples = 0
+    with wave.open(str(outPath), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(time.sampleRate)
+
+        for block in blocks:
+            pcm = np.clip(block, -1, 1) * 32767
+            f.writeframes(pcm.astype(np.int16).tobytes())
+            samples += block.shape[0]
+
+    return samples / time.sampleRate
+
+def render (path, outPath, keyboard, blockSize=8192, gain=0.5, release=0.01, skipDrums=True):
+
+    '''
+    Renders a MIDI file through the baked tones of a keyboard straight
+    into a 16-bit mono wav file. Returns the rendered length in seconds.
+    '''
+
+    notes = load(path, keyboard, skipDrums)
+    return write(mix(notes, keyboard, blockSize, gain, release), outPath)
+
+def initWorker (generator, toneDuration, amplification, sampleRate):
+
+    global workerKeyboard
+    time.sampleRate = sampleRate
+    workerKeyboard = keyBoard()
+    workerKeyboard.toneDuration = toneDuration
+    workerKeyboard.amplification = amplification
+    workerKeyboard.applyGenerator(generator)
+
+def renderJob (job):
+
+    path, outPath, kwargs = job
+    start = perf_counter()
+    seconds = render(path, outPath, workerKeyboard, **kwargs)
+    return str(path), str(outPath), seconds, perf_counter() - start
+
+def outputNames (paths):
+
+    '''
+    Maps input paths onto relative wav paths below their common root,
+    refusing inputs which would end up in the same output file.
+    '''
+
+    resolved = [Path(p).resolve() for p in paths]
+    if not resolved:
+        return []
+    root = Path(os.path.commonpath([p.parent for p in resolved]))
+    names, seen = [], {}
+    for path, original in zip(resolved, paths):
+        name = path.relative_to(root).with_suffix('.wav')
+        key = str(name).lower()
+        if key in seen:
+            raise ValueError(f'{original} and {seen[key]} would both render to {name}.')
+        seen[key] = original
+        names.append(name)
+    return names
+
+def batch (paths, outDir, generator, processes=None, toneDuration=5, amplification=1, **kwargs):
+
+    '''
+    Renders many MIDI files across worker processes, each worker bakes
+    its keyboard once. The generator has to be picklable (a module level
+    function, not a lambda). Outputs mirror the input paths relative to
+    their common root. Returns the per file results and the throughput
+    in seconds of audio rendered per wall clock second.
+    '''
+
+    outDir = Path(outDir)
+    jobs = [(p, outDir / out, kwargs) for p, out in zip(paths, outputNames(paths))]
+    for _, out, _ in jobs:
+        out.parent.mkdir(parents=True, exist_ok=True)
+    if processes is None:
+        processes = min(len(jobs), os.cpu_count() or 1) or 1
+
+    start = perf_counter()
+    with Pool(processes, initializer=initWorker, initargs=(generator, toneDuration, amplification, time.sampleRate)) as pool:
+        results = pool.map(renderJob, jobs, chunksize=1)
+    wall = perf_counter() - start
+
+    audio = sum(r[2] for r in results)
+    return {
+        'files': results,
+        'audioSeconds': audio,
+        'wallSeconds': wall,
+        'throughput': audio / wall if wall > 0 else 0.
+    }
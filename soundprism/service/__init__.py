@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+
+'''
+Render Service Module
+'''
+
+import itertools
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import threading
+import wave
+import numpy as np
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from time import perf_counter
+from soundprism import midi
+from soundprism.signal import generator, time
+from soundprism.vst import keyBoard
+
+
+class layers:
+
+    '''
+    Serializable generator spec: a built-in generator name or a list of
+    [name, frequencyMultiplier, gain] layers which are summed up.
+    '''
+
+    def __init__ (self, spec):
+
+        if isinstance(spec, str):
+            spec = [[spec, 1, 1]]
+        self.spec = []
+        for layer in spec:
+            name, multiplier, gain = (list(layer) + [1, 1])[:3]
+            if name not in ('clock', 'parabola', 'saw', 'sine'):
+                raise ValueError(f'unknown generator "{name}".')
+            self.spec.append((name, float(multiplier), float(gain)))
+
+    def __call__ (self, f, t):
+
+        out = 0
+        for name, multiplier, gain in self.spec:
+            out = out + gain * getattr(generator, name)(multiplier * f, t)
+        return out
+
+    def key (self):
+
+        return json.dumps(self.spec)
+
+
+
+class renderService:
+
+    '''
+    Holds warm keyBoard banks per generator spec and renders jobs from a
+    priority queue (lower number first) on a pool of worker threads.
+    A job is a dict with
+        generator:      spec accepted by layers
+        score:          midi file path or a list of [start, duration, tone, velocity]
+        duration:       length in seconds, optional (follows the score)
+        format:         'wav' (file in outDir) or 'shm' (float32 shared memory)
+        toneDuration:   sustain of the baked keys in seconds, optional
+    Shared memory results belong to the service until they are released,
+    at most retain finished jobs are kept, the oldest are released first.
+    '''
+
+    def __init__ (self, workers=None, outDir='renders', cacheSize=8, blockSize=8192, retain=256):
+
+        self.outDir = Path(outDir)
+        self.cacheSize = cacheSize
+        self.blockSize = blockSize
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.jobs = {}
+        self.finished = deque()
+        self.retain = retain
+        self.lock = threading.Lock()
+
+        # warm instruments, least recently used is dropped first
+        self.keyboards = {}
+        self.bakeLocks = {}
+
+        self.started = perf_counter()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'audioSeconds': 0., 'renderSeconds': 0.}
+
+        if workers is None: workers = os.cpu_count() or 1
+        self.workers = [threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for w in self.workers:
+            w.start()
+
+    def submit (self, job, priority=0):
+
+        # a priority which does not compare with numbers would break the queue
+        try:
+            priority = float(priority)
+        except (TypeError, ValueError):
+            raise ValueError('priority must be a number.')
+        if not math.isfinite(priority):
+            raise ValueError('priority must be a finite number.')
+        if job.get('format', 'wav') not in ('wav', 'shm'):
+            raise ValueError('format must be "wav" or "shm".')
+        layers(job['generator'])
+        id = next(self.counter)
+        with self.lock:
+            self.jobs[id] = {'status': 'queued', 'result': None, 'error': None, 'done': threading.Event(), 'shm': None}
+            self.stats['submitted'] += 1
+        self.queue.put((priority, id, job))
+        return id
+
+    def result (self, id, timeout=None):
+
+        '''
+        Waits for a job and returns its record (status, result, error).
+        '''
+
+        entry = self.jobs.get(id)
+        if entry is None:
+            raise KeyError(f'unknown or released job {id}.')
+        entry['done'].wait(timeout)
+        return {k: entry[k] for k in ('status', 'result', 'error')}
+
+    def release (self, id):
+
+        '''
+        Forgets a finished job and unlinks its shared memory.
+        Returns False if the job is still queued or running.
+        '''
+
+        with self.lock:
+            entry = self.jobs.get(id)
+            if entry is None:
+                raise KeyError(f'unknown or released job {id}.')
+            if not entry['done'].is_set():
+                return False
+            del self.jobs[id]
+            if id in self.finished:
+                self.finished.remove(id)
+        if entry['shm'] is not None:
+            try:
+                entry['shm'].unlink()
+            except FileNotFoundError:
+                # already unlinked by the consumer, drop our tracker record
+                resource_tracker.unregister(entry['shm']._name, 'shared_memory')
+        return True
+
+    def metrics (self):
+
+        with self.lock:
+            running = sum(1 for j in self.jobs.values() if j['status'] == 'running')
+            stats = dict(self.stats)
+        wall = perf_counter() - self.started
+        stats.update({
+            'queueDepth': self.queue.qsize(),
+            'running': running,
+            'workers': len(self.workers),
+            'cachedInstruments': len(self.keyboards),
+            'uptime': wall,
+            'throughput': stats['audioSeconds'] / wall if wall > 0 else 0.,
+            'renderSpeed': stats['audioSeconds'] / stats['renderSeconds'] if stats['renderSeconds'] > 0 else 0.
+        })
+        return stats
+
+    def shutdown (self):
+
+        for _ in self.workers:
+            self.queue.put((float('inf'), next(self.counter), None))
+        for w in self.workers:
+            w.join()
+
+        # nothing is left behind in shared memory
+        for id in list(self.finished):
+            self.release(id)
+
+    def keyboard (self, spec, toneDuration):
+
+        '''
+        Returns a warm keyboard for the spec, baking it once per spec.
+        '''
+
+        gen = layers(spec)
+        key = (gen.key(), toneDuration)
+        with self.lock:
+            if key in self.keyboards:
+                self.keyboards[key] = self.keyboards.pop(key)
+                return self.keyboards[key]
+            bakeLock = self.bakeLocks.setdefault(key, threading.Lock())
+
+        # concurrent jobs for the same instrument wait for a single bake
+        with bakeLock:
+            with self.lock:
+                if key in self.keyboards:
+                    return self.keyboards[key]
+            try:
+                piano = keyBoard()
+                piano.toneDuration = toneDuration
+                piano.applyGenerator(gen)
+            except Exception:
+                with self.lock:
+                    self.bakeLocks.pop(key, None)
+                raise
+            with self.lock:
+                self.keyboards[key] = piano
+                while len(self.keyboards) > self.cacheSize:
+                    evicted = next(iter(self.keyboards))
+                    self.keyboards.pop(evicted)
+                    self.bakeLocks.pop(evicted, None)
+            return piano
+
+    def work (self):
+
+        while True:
+            priority, id, job = self.queue.get()
+            if job is None:
+                return
+            entry = self.jobs[id]
+            with self.lock:
+                entry['status'] = 'running'
+            start = perf_counter()
+            try:
+                entry['result'] = self.render(id, job, entry)
+                entry['status'] = 'done'
+            except Exception as e:
+                entry['error'] = f'{type(e).__name__}: {e}'
+                entry['status'] = 'failed'
+            elapsed = perf_counter() - start
+            with self.lock:
+                if entry['status'] == 'done':
+                    self.stats['completed'] += 1
+                    self.stats['audioSeconds'] += entry['result']['seconds']
+                else:
+                    self.stats['failed'] += 1
+                self.stats['renderSeconds'] += elapsed
+                self.finished.append(id)
+                expired = list(self.finished)[:max(0, len(self.finished) - self.retain)]
+            for old in expired:
+                self.release(old)
+            entry['done'].set()
+
+    def render (self, id, job, entry):
+
+        piano = self.keyboard(job['generator'], job.get('toneDuration', 5))
+        score = job['score']
+        if isinstance(score, str):
+            notes = midi.load(score, piano)
+        else:
+            notes = sorted((midi.note(float(s), float(d), tone, v, 0) for s, d, tone, v in score), key=lambda n: n.start)
+            for n in notes:
+                if n.tone not in piano.toneRate:
+                    raise ValueError(f'unknown tone "{n.tone}".')
+        blocks = midi.mix(notes, piano, self.blockSize, duration=job.get('duration'))
+
+        if job.get('format', 'wav') == 'wav':
+            self.outDir.mkdir(parents=True, exist_ok=True)
+            path = self.outDir / f'job{id}.wav'
+            seconds = midi.write(blocks, path)
+            return {'format': 'wav', 'path': str(path), 'seconds': seconds, 'sampleRate': time.sampleRate}
+
+        # stream the blocks straight into shared memory
+        samples = midi.length(notes, duration=job.get('duration'))
+        shm = shared_memory.SharedMemory(create=True, size=max(1, samples * 4))
+        out = np.ndarray((samples,), dtype=np.float32, buffer=shm.buf)
+        offset = 0
+        for block in blocks:
+            out[offset:offset + block.shape[0]] = block
+            offset += block.shape[0]
+        del out
+        shm.close()
+        entry['shm'] = shm
+        return {'format': 'shm', 'name': shm.name, 'pid': os.getpid(), 'samples': samples, 'seconds': samples / time.sampleRate, 'sampleRate': time.sampleRate}
+
+
+
+class handler (socketserver.StreamRequestHandler):
+
+    '''
+    One JSON request per line, one JSON response per line.
+    '''
+
+    def handle (self):
+
+        service = self.server.service
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'submit':
+                    response = {'id': service.submit(request['job'], request.get('priority', 0))}
+                elif op == 'result':
+                    response = service.result(request['id'], request.get('timeout'))
+                elif op == 'release':
+                    response = {'released': service.release(request['id'])}
+                elif op == 'metrics':
+                    response = service.metrics()
+                elif op == 'shutdown':
+                    response = {'ok': True}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    raise ValueError(f'unknown op "{op}".')
+            except Exception as e:
+                response = {'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+
+def serve (address='/tmp/soundprism.sock', **kwargs):
+
+    '''
+    Runs the render daemon on a unix socket path or a (host, port) tuple
+    until a shutdown request arrives.
+    '''
+
+    service = renderService(**kwargs)
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)
+        server = socketserver.ThreadingUnixStreamServer(address, handler)
+    else:
+        server = socketserver.ThreadingTCPServer(tuple(address), handler)
+    server.daemon_threads = True
+    server.service = service
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+
+
+class client:
+
+    '''
+    Talks to a running render daemon.
+    '''
+
+    def __init__ (self, address='/tmp/soundprism.sock'):
+
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address if isinstance(address, str) else tuple(address))
+        self.file = self.socket.makefile('rwb')
+
+    def request (self, **request):
+
+        self.file.write((json.dumps(request) + '\n').encode())
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response and response['error'] and 'status' not in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def submit (self, job, priority=0):
+
+        return self.request(op='submit', job=job, priority=priority)['id']
+
+    def result (self, id, timeout=None):
+
+        return self.request(op='result', id=id, timeout=timeout)
+
+    def release (self, id):
+
+        return self.request(op='release', id=id)['released']
+
+    def metrics (self):
+
+        return self.request(op='metrics')
+
+    def shutdown (self):
+
+        return self.request(op='shutdown')
+
+    def close (self):
+
+        self.file.close()
+        self.socket.close()
+
+
+
+class localClient:
+
+    '''
+    In-process stand-in for client, same interface without a socket.
+    '''
+
+    def __init__ (self, service=None, **kwargs):
+
+        self.service = renderService(**kwargs) if service is None else service
+
+    def submit (self, job, priority=0):
+
+        return self.service.submit(job, priority)
+
+    def result (self, id, timeout=None):
+
+        return self.service.result(id, timeout)
+
+    def release (self, id):
+
+        return self.service.release(id)
+
+    def metrics (self):
+
+        return self.service.metrics()
+
+    def shutdown (self):
+
+        self.service.shutdown()
+        return {'ok': True}
+
+    def close (self):
+
+        pass
+
+
+
+# ==== global methods ====
+def fetch (result):
+
+    '''
+    Loads a finished job result as an array. Shared memory is copied
+    out, it stays owned by the service until the job is released.
+    Wav files are read back.
+    '''
+
+    if result['format'] == 'shm':
+        shm = shared_memory.SharedMemory(name=result['name'])
+        signal = np.ndarray((result['samples'],), dtype=np.float32, buffer=shm.buf).copy()
+        shm.close()
+        if result.get('pid') != os.getpid():
+            # attaching registered the segment with our tracker, the daemon owns it
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return signal
+
+    with wave.open(result['path'], 'rb') as f:
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32767
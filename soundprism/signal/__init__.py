@@ -7,9 +7,12 @@ Signal Module
 import matplotlib.pyplot as plt 
 from argparse import ArgumentError
 import numpy as np
+from fractions import Fraction
+from math import ceil
+from numpy.lib.mixins import NDArrayOperatorsMixin
 from time import sleep
-import sounddevice as sd
 from pathlib import Path
+from soundprism import backend as backends
 
 
 class units:
@@ -37,6 +40,9 @@ class time:
     
     def lineFromSignal (signal, start=0):
 
+        if isinstance(signal, Signal):
+            return signal.timeline
+
         seconds = signal.shape[0]/time.sampleRate
 
         return time.line(seconds, start=start)
@@ -49,6 +55,131 @@ class time:
 
         return np.round( 2 * frequency + 1 )
 
+    def rateOf (*signals):
+
+        '''
+        Returns the common sample rate of the provided signals,
+        bare arrays fall back to the global time.sampleRate.
+        '''
+
+        rate = None
+        for signal in signals:
+            if isinstance(signal, Signal):
+                if rate is not None and signal.sampleRate != rate:
+                    raise ValueError(f'sample rates {rate} and {signal.sampleRate} do not match, resample first.')
+                rate = signal.sampleRate
+        return time.sampleRate if rate is None else rate
+
+
+
+class Signal (NDArrayOperatorsMixin):
+
+    '''
+    Lightweight signal container: a 1-D array together with its sample
+    rate and start offset in seconds. Slicing returns views, the timeline
+    is derived on first use. Numpy treats it as an array, ufuncs and
+    operators return Signals again and refuse to mix sample rates.
+    '''
+
+    __slots__ = ('data', 'sampleRate', 'start', '_timeline')
+
+    def __init__ (self, data, sampleRate=None, start=0., dtype=None):
+
+        self.data = np.asarray(data, dtype=dtype)
+        self.sampleRate = time.sampleRate if sampleRate is None else sampleRate
+        self.start = start
+        self._timeline = None
+
+    def __array__ (self, dtype=None, copy=None):
+
+        if dtype is None or dtype == self.data.dtype:
+            return self.data.copy() if copy else self.data
+        return self.data.astype(dtype)
+
+    def __array_ufunc__ (self, ufunc, method, *inputs, **kwargs):
+
+        args = [x.data if isinstance(x, Signal) else x for x in inputs]
+        rate = time.rateOf(*inputs)
+        out = kwargs.get('out')
+        if out:
+            kwargs['out'] = tuple(o.data if isinstance(o, Signal) else o for o in out)
+
+        result = getattr(ufunc, method)(*args, **kwargs)
+
+        if out:
+            return out[0] if len(out) == 1 else out
+        if method == '__call__' and isinstance(result, np.ndarray) and result.shape == self.data.shape:
+            return Signal(result, rate, self.start)
+        return result
+
+    def __getitem__ (self, key):
+
+        data = self.data[key]
+        if isinstance(key, slice) and data.ndim == 1:
+            first, _, step = key.indices(self.data.shape[0])
+            if step < 0:
+                return data
+            rate = self.sampleRate if step == 1 else self.sampleRate / step
+            return Signal(data, rate, self.start + first / self.sampleRate)
+        return data
+
+    def __setitem__ (self, key, value):
+
+        self.data[key] = np.asarray(value)
+
+    def __len__ (self):
+
+        return self.data.shape[0]
+
+    def __repr__ (self):
+
+        return f'Signal({self.data.shape[0]} samples, {self.sampleRate} Hz, start={self.start} s, {self.data.dtype})'
+
+    @property
+    def dtype (self):
+
+        return self.data.dtype
+
+    @property
+    def shape (self):
+
+        return self.data.shape
+
+    @property
+    def duration (self):
+
+        return self.data.shape[0] / self.sampleRate
+
+    @property
+    def end (self):
+
+        return self.start + self.duration
+
+    @property
+    def timeline (self):
+
+        if self._timeline is None:
+            self._timeline = self.start + np.arange(self.data.shape[0]) / self.sampleRate
+        return self._timeline
+
+    def index (self, seconds):
+
+        '''
+        Converts an absolute time in seconds to a sample index.
+        '''
+
+        return int(round((seconds - self.start) * self.sampleRate))
+
+    def between (self, start=None, stop=None):
+
+        '''
+        Returns the view between two absolute times in seconds.
+        '''
+
+        first = 0 if start is None else max(0, self.index(start))
+        last = self.data.shape[0] if stop is None else max(first, self.index(stop))
+        return self[first:last]
+
 
 
 class filter:
@@ -67,24 +198,205 @@ class filter:
 
 class scale:
 
-    def amplitudeRange (signal, min, max):
+    blockSize = 65536
+
+    def extrema (signal, blockSize=None):
+
+        '''
+        Returns (min, max) in a single pass over memory. Both reductions run
+        on the same cache-sized block, so long or memory-mapped signals
+        are only streamed through once. NaN samples propagate into both.
+        '''
+
+        if blockSize is None: blockSize = scale.blockSize
+        signal = np.asarray(signal)
+        if signal.size == 0:
+            raise ValueError('extrema of an empty signal are undefined.')
+        sig_min, sig_max = np.inf, -np.inf
+        for i in range(0, signal.shape[0], blockSize):
+            block = signal[i:i+blockSize]
+            sig_min = np.minimum(sig_min, block.min())
+            sig_max = np.maximum(sig_max, block.max())
+        return sig_min, sig_max
 
-        sig_max, sig_min = np.max(signal), np.min(signal)
-        sig_normalized, scale = signal - sig_min, (max-min)/(sig_max-sig_min)
-        return sig_normalized * scale + min
+    def amplitudeRange (signal, min, max, out=None, inplace=False):
+
+        '''
+        Linearly maps the signal onto [min, max]. Writes into out (or into
+        the signal itself if inplace) instead of allocating a new array.
+        Multiply and add run on the same cache-sized block, so the output
+        is streamed through memory only once.
+        A constant signal is mapped onto min. Signals containing NaN or inf
+        and in-place scaling of integer signals raise a ValueError.
+        '''
+
+        data = np.asarray(signal)
+        floating = np.issubdtype(data.dtype, np.floating)
+        if inplace and not floating:
+            raise ValueError('inplace scaling needs a floating point signal.')
+        sig_min, sig_max = scale.extrema(data)
+        if not (np.isfinite(sig_min) and np.isfinite(sig_max)):
+            raise ValueError('signal contains NaN or inf samples.')
+        if sig_max > sig_min:
+            factor = (max - min) / (sig_max - sig_min)
+        else:
+            factor = 0.
+        offset = min - sig_min * factor
+
+        if inplace:
+            out = signal
+        elif out is None:
+            out = np.empty(data.shape, dtype=data.dtype if floating else np.float64)
+            if isinstance(signal, Signal):
+                out = Signal(out, signal.sampleRate, signal.start)
+        target = np.asarray(out)
+        for i in range(0, data.shape[0], scale.blockSize):
+            block = target[i:i+scale.blockSize]
+            np.multiply(data[i:i+scale.blockSize], factor, out=block)
+            np.add(block, offset, out=block)
+        return out
     
-    def normalize (signal):
+    def normalize (signal, out=None, inplace=False):
 
-        return scale.amplitudeRange(signal, 0, 1)
+        return scale.amplitudeRange(signal, 0, 1, out=out, inplace=inplace)
     
-    def shiftToNonNegative(signal):
+    def shiftToNonNegative(signal, out=None, inplace=False):
+
+        if inplace: out = signal
+        return np.subtract(signal, np.min(signal), out=out)
+
+
+
+class limiter:
+
+    '''
+    Streaming look-ahead peak limiter. Blocks are levelled by gain and
+    limited to |ceiling| without materializing the whole signal. The
+    gain reduction ramps in over the look-ahead window before a peak and
+    ramps out over the same window after it, the output is delayed by
+    lookahead - 1 samples (see flush).
+    '''
+
+    def __init__ (self, ceiling=1.0, lookahead=0.005, gain=1.0):
+
+        self.ceiling = ceiling
+        self.gain = gain
+        self.length = max(1, int(lookahead * time.sampleRate))
+
+        # histories carried between blocks
+        L = self.length
+        self.ratioHistory = np.ones(2 * L - 2)
+        self.minHistory = np.ones(L - 1)
+        self.delay = np.zeros(L - 1)
+
+    def slidingMin (values, width):
+
+        '''
+        Minimum over every window of width, van Herk/Gil-Werman in O(n).
+        '''
+
+        n = values.shape[0]
+        if width == 1:
+            return values.copy()
+        chunks = -(-n // width)
+        padded = np.full(chunks * width, np.inf)
+        padded[:n] = values
+        padded = padded.reshape(chunks, width)
+        prefix = np.minimum.accumulate(padded, axis=1).ravel()
+        suffix = np.minimum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        return np.minimum(suffix[:n - width + 1], prefix[width - 1:n])
+
+    def push (self, block):
+
+        L = self.length
+        x = np.asarray(block, dtype=np.float64) * self.gain
+
+        # gain needed by every sample
+        ratio = self.ceiling / np.maximum(np.abs(x), self.ceiling)
+
+        # hold the minimum over 2L-1 samples then smooth over L samples
+        ratios = np.concatenate((self.ratioHistory, ratio))
+        held = limiter.slidingMin(ratios, 2 * L - 1)
+        helds = np.concatenate((self.minHistory, held))
+        sums = np.concatenate(([0.], np.cumsum(helds)))
+        smooth = (sums[L:] - sums[:-L]) / L
+
+        # apply to the delayed input
+        delayed = np.concatenate((self.delay, x))
+        out = delayed[:x.shape[0]] * smooth
+
+        if L > 1:
+            self.ratioHistory = ratios[-(2 * L - 2):]
+            self.minHistory = helds[-(L - 1):]
+            self.delay = delayed[-(L - 1):]
+        np.clip(out, -self.ceiling, self.ceiling, out=out)
+        return out
+
+    def flush (self):
+
+        '''
+        Pushes silence to release the delayed tail.
+        '''
+
+        return self.push(np.zeros(self.length - 1))
 
-        return signal - np.min(signal)
 
-        
 
 class generator:
 
+    # generators known to broadcast a frequency column over a timeline row
+    broadcastable = set()
+
+    def bank (gen, frequencies, t, rows=None, columns=None, out=None):
+
+        '''
+        Bakes a (frequencies x time) bank of signals. Built-in generators
+        are evaluated once per tile of rows x columns samples, which caps
+        the temporaries. Other generators which broadcast (lambdas composed
+        of element-wise operations) are evaluated rows at a time over the
+        whole timeline, as they may depend on its length (envelopes,
+        normalization). The rest falls back to one call per frequency.
+        '''
+
+        frequencies = np.asarray(frequencies, dtype=np.float64).ravel()
+        t = np.asarray(t)
+        F, T = frequencies.shape[0], t.shape[0]
+        if rows is None: rows = F
+        if columns is None or gen not in generator.broadcastable: columns = T
+        if out is None: out = np.empty((F, T), dtype=np.float64)
+        if F == 0 or T == 0:
+            return out
+
+        if generator.broadcasts(gen, frequencies, t):
+            for r in range(0, F, rows):
+                column = frequencies[r:r+rows, None]
+                for c in range(0, T, columns):
+                    out[r:r+rows, c:c+columns] = gen(column, t[c:c+columns])
+        else:
+            for i in range(F):
+                out[i] = gen(frequencies[i], t)
+
+        return out
+
+    def broadcasts (gen, frequencies, t):
+
+        '''
+        Probes a generator on the first two frequencies over the timeline
+        it will be evaluated on and compares against scalar calls, so
+        reductions over frequencies are never broadcast by accident.
+        '''
+
+        if gen in generator.broadcastable:
+            return True
+        probe = frequencies[:2]
+        try:
+            batch = np.asarray(gen(probe[:, None], t))
+            if batch.shape != (probe.shape[0], t.shape[0]):
+                return False
+            return all(np.allclose(batch[i], gen(probe[i], t), equal_nan=True) for i in range(probe.shape[0]))
+        except Exception:
+            return False
+
     def clock (frequency, t, t0=0, pulseWidth=0.1):
         if t0 < 0: ValueError('t0 must be positive!')
         T = 1/frequency
@@ -117,20 +429,157 @@ class generator:
         else: t = t * frequency * units.period["1"]
         return np.sin( np.linspace( 0, t, time.sampleRate * t ) )
 
+generator.broadcastable.update((generator.clock, generator.parabola, generator.saw, generator.sine))
+
+
+class clockStream:
+
+    '''
+    Streaming clock/PWM generator driven by an integer phase accumulator.
+    One period is sampleRate * denominator * resolution phase units and
+    every sample advances the phase by frequency * denominator * resolution
+    units, so the timing is exact for rational frequencies and never
+    drifts, however long it runs. Frequency and pulse width changes are
+    applied at the next period boundary, so no period is ever cut short
+    or stretched. The phase unit is rebuilt from the new frequency alone,
+    the part of the leftover phase below one unit is carried over to the
+    next change, so rounding never accumulates and state stays in int64.
+    '''
+
+    resolution = 1 << 16
+    chunkSize = 1 << 20
+
+    def __init__ (self, frequency, pulseWidth=0.1, sampleRate=None, high=1., low=0., maxDenominator=1000):
+
+        self.sampleRate = time.sampleRate if sampleRate is None else int(sampleRate)
+        self.high, self.low = high, low
+        self.maxDenominator = maxDenominator
+        self.phase = 0
+        self.carry = 0.
+        self.samples = 0
+        self.periods = 0
+        self.pending = None
+        self.apply(*self.fractions(frequency, pulseWidth))
+
+    def fractions (self, frequency, pulseWidth):
+
+        frequency = Fraction(frequency).limit_denominator(self.maxDenominator)
+        pulseWidth = Fraction(pulseWidth).limit_denominator(self.maxDenominator)
+        if frequency <= 0 or frequency > Fraction(self.sampleRate, 2):
+            raise ValueError('frequency must be in (0, sampleRate/2].')
+        if not 0 <= pulseWidth <= 1:
+            raise ValueError('pulseWidth must be in [0, 1].')
+        return frequency, pulseWidth
+
+    def apply (self, frequency, pulseWidth):
+
+        self.frequency, self.pulseWidth = frequency, pulseWidth
+        self.cycle = self.sampleRate * frequency.denominator * clockStream.resolution
+        self.increment = frequency.numerator * clockStream.resolution
+        # integer phases below ceil(pulseWidth * cycle) are high
+        self.threshold = ceil(pulseWidth * self.cycle)
+        # samples per vectorized step so phase + increment * samples fits into int64
+        self.chunk = max(1, min(clockStream.chunkSize, ((1 << 62) - self.cycle) // self.increment))
+
+    def switch (self):
+
+        '''
+        Applies the pending parameters right after a period boundary and
+        converts the leftover phase into the new unit, rounded to whole
+        units with the remainder carried on.
+        '''
+
+        phase, carry, increment = self.phase, self.carry, self.increment
+        self.apply(*self.pending)
+        self.pending = None
+
+        exact = Fraction(phase * self.increment, increment)
+        self.phase = round(exact)
+        carry = float(exact - self.phase) + carry * self.increment / increment
+        shift = round(carry)
+        self.phase += shift
+        self.carry = carry - shift
+        if self.phase < 0:
+            self.carry += self.phase
+            self.phase = 0
+
+    def set (self, frequency=None, pulseWidth=None):
+
+        '''
+        Schedules a new frequency and/or pulse width for the next period.
+        '''
+
+        current = self.pending or (self.frequency, self.pulseWidth)
+        self.pending = self.fractions(
+            current[0] if frequency is None else frequency,
+            current[1] if pulseWidth is None else pulseWidth
+        )
+
+    def pulse (self, phases, out):
+
+        np.copyto(out, np.where(phases < self.threshold, self.high, self.low))
+
+    def read (self, n):
+
+        '''
+        Returns the next n samples, constant memory and work per sample.
+        '''
+
+        out = np.empty(n, dtype=np.float64)
+        k = 0
+
+        # run up to the next period boundary before switching parameters
+        while self.pending is not None and k < n:
+            m = min(-(-(self.cycle - self.phase) // self.increment), n - k, self.chunk)
+            self.pulse(self.phase + self.increment * np.arange(m, dtype=np.int64), out[k:k+m])
+            self.phase += self.increment * m
+            k += m
+            if self.phase >= self.cycle:
+                self.phase -= self.cycle
+                self.periods += 1
+                self.switch()
+
+        # chunked so phase + increment * samples always fits into int64
+        while k < n:
+            m = min(n - k, self.chunk)
+            phases = self.phase + self.increment * np.arange(m, dtype=np.int64)
+            self.pulse(phases % self.cycle, out[k:k+m])
+            self.phase += self.increment * m
+            self.periods += self.phase // self.cycle
+            self.phase %= self.cycle
+            k += m
+
+        self.samples += n
+        return out
+
 
 
 class sound:
+
+    # pluggable output, sounddevice if usable otherwise the headless null backend
+    backend = backends.default()
             
     def play (signal, blocking=False):
 
-        sd.play(np.array(signal), time.sampleRate, blocking=blocking)
+        sound.backend.play(np.asarray(signal), time.rateOf(signal), blocking=blocking)
+
+    def setBackend (backend):
+
+        '''
+        Replace the output backend, e.g. by backends.nullBackend()
+        to run and benchmark playback without a sound card.
+        '''
+
+        sound.stop()
+        sound.backend = backend
+        sound.backend.setRate(time.sampleRate)
 
     def setDevice (id):
 
         if type(id) is not int or id < 0:
             ArgumentError("id must be a non-negative integer.")
         try:
-            sd.default.device = int(id)
+            sound.backend.setDevice(id)
         except:
             print(f'device id {id} not usable.')
     
@@ -138,20 +587,24 @@ class sound:
 
         '''
         If None is provided the default sample rate is taken.
-        Override the sample rate in sd object accordingly.
+        Override the sample rate in the backend accordingly.
         '''
 
         if frequency != None:
-            time.samplingRate = frequency
-        sd.default.samplerate = time.sampleRate
+            time.sampleRate = frequency
+        sound.backend.setRate(time.sampleRate)
 
     def showDevices ():
 
-        sd.query_devices()
+        return sound.backend.showDevices()
 
     def stop ():
 
-        sd.stop()
+        sound.backend.stop()
+
+    def wait ():
+
+        sound.backend.wait()
 
 
 
@@ -169,16 +622,22 @@ def combine (signal_1, signal_2, start=None, mode='add'):
     if start and start < 0: 
         ValueError('provided start time at which to combine has to be positive.')
 
+    # keep rate and offset of wrapped signals, refuse mixed rates
+    rate = time.rateOf(signal_1, signal_2)
+    inputs = (signal_1, signal_2)
+    signal_1, signal_2 = np.asarray(signal_1), np.asarray(signal_2)
+
     # decide on main and second channel by length
     main, second = None, None
     if signal_1.shape[0] >= signal_2.shape[0]:
         main, second = signal_1, signal_2
     else:
         main, second = signal_2, signal_1
+        inputs = inputs[::-1]
 
     # define start index
     if start:
-        start = int(time.sampleRate * start) # convert from seconds start to index start
+        start = int(rate * start) # convert from seconds start to index start
     else:
         start = 0
 
@@ -206,9 +665,14 @@ def combine (signal_1, signal_2, start=None, mode='add'):
         main = np.concatenate((main_slice_1, main_slice_2))
     else:
         main = main_slice_2
-    if main_slice_3 and main_slice_3.shape[0] > 0:
+    if main_slice_3 is not None and main_slice_3.shape[0] > 0:
         main = np.concatenate((main, main_slice_3))
-    
+
+    # the offset follows the main signal, which places the second one
+    if isinstance(inputs[0], Signal):
+        return Signal(main, rate, inputs[0].start)
+    if isinstance(inputs[1], Signal):
+        return Signal(main, rate)
     return main
 
 def equal (signal_1, signal_2):
@@ -237,18 +701,25 @@ def extrapolate (signal, t):
 
 def plot (signal, start=None, stop=None, savepath=None, label='Signal', show=True, color='#ffd900',  facecolor='black', edgecolor='white'):
 
-    timeline = time.lineFromSignal(signal)
+    rate = time.rateOf(signal)
+    if isinstance(signal, Signal):
+        # cut to range by views, the timeline follows the offset
+        if start and stop:
+            signal = signal.between(signal.start + start, signal.start + stop)
+        timeline = signal.timeline
+    else:
+        timeline = time.lineFromSignal(signal)
     
-    # cut to range
-    if start and stop:
-        timeline = timeline[int(start*time.sampleRate):int(stop*time.sampleRate)]
-        signal = signal[int(start*time.sampleRate):int(stop*time.sampleRate)]
+        # cut to range
+        if start and stop:
+            timeline = timeline[int(start*rate):int(stop*rate)]
+            signal = signal[int(start*rate):int(stop*rate)]
 
     # build the figure
-    dt = np.round(10**6/time.sampleRate,2)
+    dt = np.round(10**6/rate,2)
     fig = plt.figure(dpi=150, facecolor=facecolor, edgecolor=edgecolor)
     ax = fig.add_subplot(1, 1, 1)
-    ax.plot(timeline, signal, color=color, label=label)
+    ax.plot(timeline, np.asarray(signal), color=color, label=label)
     ax.set_facecolor(facecolor)
     ax.set_xlabel(f'time in s in interval {dt}μs')
     ax.yaxis.tick_right()
@@ -273,7 +744,3 @@ def square (signal):
     '''
 
     return combine(signal, signal, mode='multiply')
-
-
-sig = generator.clock(50, time.line(2), 0, 0.1)
-plot(sig)
\ No newline at end of file
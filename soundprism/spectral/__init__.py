@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+'''
+Spectral Module
+'''
+
+import matplotlib.pyplot as plt
+import numpy as np
+from pathlib import Path
+from soundprism.signal import time
+
+
+class windows:
+
+    '''
+    Periodic analysis windows, baked once per (name, size) and reused.
+    Tapered windows are only invertible with overlapping frames.
+    '''
+
+    cache = {}
+    functions = {
+        "hann": lambda size: np.hanning(size + 1)[:-1],
+        "hamming": lambda size: np.hamming(size + 1)[:-1],
+        "blackman": lambda size: np.blackman(size + 1)[:-1],
+        "rect": np.ones
+    }
+
+    def get (name, size):
+
+        key = (name, size)
+        if key not in windows.cache:
+            if name not in windows.functions:
+                raise ValueError(f'unknown window "{name}", choose from {list(windows.functions)}.')
+            w = np.asarray(windows.functions[name](size), dtype=np.float64)
+            w.setflags(write=False)
+            windows.cache[key] = w
+        return windows.cache[key]
+
+
+
+class analyzer:
+
+    '''
+    Block-streaming short-time fourier transform.
+    Blocks of arbitrary length are pushed in and all frames
+    which became complete are returned as rows of spectra.
+    At most one frame of samples is held between pushes.
+    With center=True the stream is preceded by frameSize - hopSize
+    zeros, so every sample is covered by as many frames as any other
+    and can be reconstructed.
+    '''
+
+    def __init__ (self, frameSize=2048, hopSize=512, window='hann', center=True):
+
+        if hopSize < 1 or hopSize > frameSize:
+            raise ValueError('hopSize must be in [1, frameSize].')
+
+        self.frameSize = frameSize
+        self.hopSize = hopSize
+        self.window = windows.get(window, frameSize)
+        self.bins = frameSize // 2 + 1
+        self.center = center
+
+        # pending samples which did not fill a frame yet
+        self.pending = np.zeros(frameSize, dtype=np.float64)
+        self.reset()
+
+        # reusable buffers, grown on demand
+        self.samples = np.zeros(frameSize, dtype=np.float64)
+        self.frames = np.zeros((0, frameSize), dtype=np.float64)
+
+    def push (self, block):
+
+        block = np.asarray(block, dtype=np.float64)
+        total = self.filled + block.shape[0]
+        if total < self.frameSize:
+            self.pending[self.filled:total] = block
+            self.filled = total
+            return np.zeros((0, self.bins), dtype=np.complex128)
+
+        # join the pending tail with the new block in the reused sample buffer
+        if self.samples.shape[0] < total:
+            self.samples = np.zeros(total, dtype=np.float64)
+        samples = self.samples[:total]
+        samples[:self.filled] = self.pending[:self.filled]
+        samples[self.filled:] = block
+
+        # window all complete frames at once into the reused frame buffer
+        count = 1 + (total - self.frameSize) // self.hopSize
+        if self.frames.shape[0] < count:
+            self.frames = np.zeros((count, self.frameSize), dtype=np.float64)
+        frames = self.frames[:count]
+        views = np.lib.stride_tricks.sliding_window_view(samples, self.frameSize)[::self.hopSize][:count]
+        np.multiply(views, self.window, out=frames)
+
+        # keep the unconsumed rest for the next push
+        consumed = count * self.hopSize
+        rest = total - consumed
+        self.pending[:rest] = samples[consumed:]
+        self.filled = rest
+        self.emitted += count
+
+        return np.fft.rfft(frames, axis=1)
+
+    def flush (self):
+
+        '''
+        Zero-pads the samples which are not part of any frame yet into a
+        last frame and returns its spectrum (or no rows), then resets.
+        '''
+
+        covered = self.frameSize - self.hopSize if self.emitted else 0
+        if self.filled > covered:
+            spectra = self.push(np.zeros(self.frameSize - self.filled))
+        else:
+            spectra = np.zeros((0, self.bins), dtype=np.complex128)
+        self.reset()
+        return spectra
+
+    def frameCount (self, n):
+
+        '''
+        Returns the number of frames push and flush produce for n samples.
+        '''
+
+        total = n + (self.frameSize - self.hopSize if self.center else 0)
+        count = 1 + (total - self.frameSize) // self.hopSize if total >= self.frameSize else 0
+        rest = total - count * self.hopSize
+        covered = self.frameSize - self.hopSize if count else 0
+        return count + (rest > covered)
+
+    def frequencies (self, sampleRate=None):
+
+        if sampleRate is None: sampleRate = time.sampleRate
+        return np.fft.rfftfreq(self.frameSize, 1 / sampleRate)
+
+    def reset (self):
+
+        # the centering pre-roll is already zero in the pending buffer
+        self.pending[:] = 0
+        self.filled = self.frameSize - self.hopSize if self.center else 0
+        self.emitted = 0
+
+
+
+class synthesizer:
+
+    '''
+    Streaming inverse short-time fourier transform by weighted overlap-add.
+    Spectra are pushed in frame by frame and finished samples
+    (hopSize per frame) are returned.
+    '''
+
+    def __init__ (self, frameSize=2048, hopSize=512, window='hann'):
+
+        if hopSize < 1 or hopSize > frameSize:
+            raise ValueError('hopSize must be in [1, frameSize].')
+
+        self.frameSize = frameSize
+        self.hopSize = hopSize
+        self.window = windows.get(window, frameSize)
+
+        # squared window sums seen by an output hop after k+1 overlapping frames
+        hop = hopSize
+        overlaps = -(-frameSize // hop)
+        padded = np.zeros(overlaps * hop, dtype=np.float64)
+        padded[:frameSize] = self.window ** 2
+        self.norms = np.cumsum(padded.reshape(overlaps, hop), axis=0)
+        self.norms[self.norms < 1e-12] = 1.
+
+        # the tail only sees the frames which were already pushed
+        tail = padded[hop:].reshape(overlaps - 1, hop)[::-1].cumsum(axis=0)[::-1].ravel()
+        tail[tail < 1e-12] = 1.
+        self.tailNorm = tail[:frameSize - hop]
+
+        self.accumulator = np.zeros(frameSize, dtype=np.float64)
+        self.count = 0
+
+    def push (self, spectra):
+
+        spectra = np.atleast_2d(spectra)
+        hop = self.hopSize
+        out = np.empty(spectra.shape[0] * hop, dtype=np.float64)
+        frames = np.fft.irfft(spectra, n=self.frameSize, axis=1)
+        frames *= self.window
+        acc = self.accumulator
+        last = self.norms.shape[0] - 1
+        for i in range(frames.shape[0]):
+            acc += frames[i]
+            np.divide(acc[:hop], self.norms[min(self.count, last)], out=out[i*hop:(i+1)*hop])
+            acc[:-hop] = acc[hop:]
+            acc[-hop:] = 0
+            self.count += 1
+        return out
+
+    def flush (self):
+
+        '''
+        Returns the remaining tail and resets the synthesizer.
+        '''
+
+        size = self.frameSize - self.hopSize
+        tail = self.accumulator[:size] / self.tailNorm if self.count else np.zeros(0)
+        self.accumulator[:] = 0
+        self.count = 0
+        return tail
+
+
+
+# ==== global methods ====
+def blocks (signal, blockSize=65536):
+
+    '''
+    Yields consecutive blocks of a (possibly memory-mapped) signal
+    without touching more than blockSize samples at once.
+    '''
+
+    for i in range(0, signal.shape[0], blockSize):
+        yield signal[i:i+blockSize]
+
+def stft (signal, frameSize=2048, hopSize=512, window='hann', blockSize=65536, center=True):
+
+    '''
+    Yields 2-D arrays of complex spectra (frames x bins),
+    one array per processed block of the signal. The last
+    partial frame is zero-padded.
+    '''
+
+    a = analyzer(frameSize, hopSize, window, center)
+    for block in blocks(signal, blockSize):
+        spectra = a.push(block)
+        if spectra.shape[0] > 0:
+            yield spectra
+    spectra = a.flush()
+    if spectra.shape[0] > 0:
+        yield spectra
+
+def istft (spectra, frameSize=2048, hopSize=512, window='hann', center=True, length=None):
+
+    '''
+    Reconstructs a signal from spectra, which can be a 2-D array
+    or an iterable of 2-D arrays as produced by stft. The centering
+    pre-roll is removed, length cuts off the zero padding of the
+    last frame.
+    '''
+
+    if isinstance(spectra, np.ndarray):
+        spectra = [spectra]
+
+    s = synthesizer(frameSize, hopSize, window)
+    parts = [s.push(chunk) for chunk in spectra]
+    parts.append(s.flush())
+
+    signal = np.concatenate(parts)
+    if center:
+        signal = signal[frameSize - hopSize:]
+    if length is not None:
+        signal = signal[:length]
+    return signal
+
+def spectrogram (signal, frameSize=2048, hopSize=512, window='hann', width=None, height=None, blockSize=65536):
+
+    '''
+    Returns the magnitude spectrogram (bins x columns) in dB,
+    max-pooled down to width columns and height rows.
+    Frames are reduced as they are computed so memory is
+    bounded by the output resolution.
+    '''
+
+    n = signal.shape[0]
+    if n == 0:
+        raise ValueError('spectrogram of an empty signal is undefined.')
+    frameCount = analyzer(frameSize, hopSize, window).frameCount(n)
+    bins = frameSize // 2 + 1
+    if width is None: width = frameCount
+    if height is None: height = bins
+    width, height = min(width, frameCount), min(height, bins)
+
+    # map bins onto rows once
+    rowEdges = np.linspace(0, bins, height + 1).astype(int)[:-1]
+
+    image = np.zeros((height, width), dtype=np.float64)
+    frame = 0
+    for spectra in stft(signal, frameSize, hopSize, window, blockSize):
+        magnitude = np.abs(spectra)
+        rows = np.maximum.reduceat(magnitude, rowEdges, axis=1)
+        columns = (np.arange(frame, frame + rows.shape[0]) * width) // frameCount
+        np.maximum.at(image.T, columns, rows)
+        frame += rows.shape[0]
+
+    return 20 * np.log10(image + 1e-12)
+
+def plot (signal, frameSize=2048, hopSize=512, window='hann', floor=-100, savepath=None, show=True, cmap='magma', facecolor='black', edgecolor='white'):
+
+    '''
+    Plots the spectrogram downsampled to the figure resolution.
+    '''
+
+    fig = plt.figure(dpi=150, facecolor=facecolor, edgecolor=edgecolor)
+    ax = fig.add_subplot(1, 1, 1)
+    bbox = ax.get_window_extent()
+    image = spectrogram(signal, frameSize, hopSize, window, width=int(bbox.width), height=int(bbox.height))
+    image = np.maximum(image, image.max() + floor)
+
+    rate = time.rateOf(signal)
+    start = getattr(signal, 'start', 0.)
+    ax.imshow(image, origin='lower', aspect='auto', cmap=cmap, extent=(start, start + signal.shape[0] / rate, 0, rate / 2), interpolation='nearest')
+    ax.set_facecolor(facecolor)
+    ax.set_xlabel('time in s')
+    ax.set_ylabel('frequency in Hz')
+    ax.yaxis.tick_right()
+    ax.yaxis.set_label_position('right')
+    ax.xaxis.label.set_color(edgecolor)
+    ax.yaxis.label.set_color(edgecolor)
+    ax.tick_params(axis='x', colors=edgecolor)
+    ax.tick_params(axis='y', colors=edgecolor)
+
+    if savepath:
+        fig.savefig(Path(savepath))
+
+    if show:
+        plt.show()
+
+    plt.close(fig)
@@ -5,8 +5,13 @@ Virtual Instruments Module
 '''
 
 import numpy as np
+import threading
 from soundprism.signal import *
-from pynput import keyboard as kb
+try:
+    from pynput import keyboard as kb
+except ImportError:
+    # no keyboard listener on headless systems, offline rendering still works
+    kb = None
 
 class keyBoard ():
 
@@ -33,12 +38,25 @@ class keyBoard ():
             "B0": 30.8677,
         }
         self.amplification = 1
+        self.tileShape = (8, 8192) # tones x samples per generator call when baking
         self.volume = 1
+
+        # what every key was baked with, (generator, duration, sample rate, amplification)
+        self.bakedWith = {}
+        self.bakeThread = None
+        self.bakeCancel = threading.Event()
+        self.bakeError = None
         
         # load the tone scale for all keys
         self.loadKeyScale()
 
-    def applyGenerator (self, generator=None):
+    def applyGenerator (self, generator=None, background=False):
+
+        '''
+        Bakes all tones with the generator. With background=True the new
+        bank is built on a worker thread, keys close to the bound octaves
+        first, while the old tones stay playable until replaced.
+        '''
 
         # use the recent generator
         if generator is None:
@@ -49,9 +67,101 @@ class keyBoard ():
             # override internal generator
             self.currentGenerator = generator
 
-        for tone, rate in self.toneRate.items():
+        tones = self.keyPriority()
+        if background:
+            self.bakeInBackground(tones)
+        else:
+            self.cancelBake()
+            self.bakeTones(tones)
+
+    def bakeTones (self, tones=None, cancel=None):
+
+        '''
+        Bakes the tones with the current generator in banks of
+        tileShape rows, each key holds a row view of its bank.
+        Keys are swapped in as soon as their bank is finished.
+        '''
+
+        if tones is None: tones = list(self.toneRate)
+        gen, duration, amplification = self.currentGenerator, self.toneDuration, self.amplification
+        timeline = time.line(duration)
+        signature = (gen, duration, time.sampleRate)
+        rows = self.tileShape[0]
+        for r in range(0, len(tones), rows):
+            if cancel is not None and cancel.is_set():
+                return
+            group = tones[r:r+rows]
+            bank = generator.bank(gen, [self.toneRate[tone] for tone in group], timeline, *self.tileShape)
+            bank *= amplification
+            for i, tone in enumerate(group):
+                self.keyTones[tone] = bank[i]
+                self.bakedWith[tone] = signature + (amplification,)
+
+    def bakeInBackground (self, tones):
+
+        # a newer bake replaces a running one
+        self.cancelBake()
+        self.bakeCancel = threading.Event()
+        self.bakeError = None
+        self.bakeThread = threading.Thread(target=self.bakeWorker, args=(tones, self.bakeCancel), daemon=True)
+        self.bakeThread.start()
+
+    def bakeWorker (self, tones, cancel):
+
+        # keep the error for waitForBake, the keys baked so far stay usable
+        try:
+            self.bakeTones(tones, cancel)
+        except Exception as e:
+            self.bakeError = e
+
+    def cancelBake (self):
+
+        if self.bakeThread is not None and self.bakeThread.is_alive():
+            self.bakeCancel.set()
+            self.bakeThread.join()
+        self.bakeThread = None
+
+    def isBaking (self):
+
+        return self.bakeThread is not None and self.bakeThread.is_alive()
+
+    def waitForBake (self):
 
-            self.keyTones[tone] = self.amplification * self.currentGenerator(rate, time.line(self.toneDuration))
+        '''
+        Waits for the background bake and re-raises its error, if any.
+        Keys which were not baked keep their old tones, refresh bakes them.
+        '''
+
+        if self.bakeThread is not None:
+            self.bakeThread.join()
+        error, self.bakeError = self.bakeError, None
+        if error is not None:
+            raise error
+
+    def keyPriority (self):
+
+        '''
+        Returns all tones ordered by their distance to the bound octaves,
+        keys mapped on the pc keyboard first.
+        '''
+
+        bound = set(self.pianoKeyMap.values())
+        levels = {int(tone[1]) for tone in bound} or {self.level, self.level + 1}
+        distance = lambda tone: (tone not in bound, min(abs(int(tone[1]) - l) for l in levels))
+        return sorted(self.toneRate, key=distance)
+
+    def rescaleTones (self, tones):
+
+        '''
+        Applies a new amplification to already baked tones without
+        calling the generator. Keys are replaced, never written in place,
+        so a tone which is being played stays intact.
+        '''
+
+        for tone in tones:
+            old = self.bakedWith[tone]
+            self.keyTones[tone] = self.keyTones[tone] * (self.amplification / old[3])
+            self.bakedWith[tone] = old[:3] + (self.amplification,)
     
     def bindTonesToKeyboard (self, level=None, live=False):
 
@@ -75,6 +185,8 @@ class keyBoard ():
 
         if live:
 
+            if kb is None:
+                raise RuntimeError('pynput is not available, live keyboard binding is disabled.')
             listener = kb.Listener(on_press=self.keyDown)
             listener.start()
             listener.join()
@@ -114,12 +226,35 @@ class keyBoard ():
                 self.keyTones[tone] = None
         self.keyTones["C8"] = 4186.01
 
-    def refresh (self):
+    def refresh (self, background=False):
 
-        "Call this method when major changes occured."
+        '''
+        Call this method when major changes occured. Keys whose only change
+        is the amplification are rescaled, the others are re-baked
+        (on a worker thread with background=True, see applyGenerator).
+        '''
 
         try:
-            self.applyGenerator()
+            if self.currentGenerator is None:
+                raise ValueError('No generator loaded yet, please initialize by providing a generator.')
+
+            # a running bake is superseded, its finished keys are kept
+            self.cancelBake()
+            signature = (self.currentGenerator, self.toneDuration, time.sampleRate)
+            rescale, rebake = [], []
+            for tone in self.keyPriority():
+                baked = self.bakedWith.get(tone)
+                if baked is not None and baked[:3] == signature:
+                    if baked[3] != self.amplification:
+                        (rescale if baked[3] != 0 else rebake).append(tone)
+                else:
+                    rebake.append(tone)
+
+            self.rescaleTones(rescale)
+            if background:
+                self.bakeInBackground(rebake)
+            else:
+                self.bakeTones(rebake)
             return True
         except Exception as e:
             print(e)
@@ -0,0 +1,86 @@
+import numpy as np
+from time import perf_counter, sleep
+from soundprism import backend as backends
+from soundprism.signal import sound, time
+
+
+def test_played_data_is_recorded ():
+
+    b = backends.nullBackend(realtime=False, blockSize=100)
+    signal = np.random.default_rng(27).standard_normal(1050)
+    b.play(signal, 44100, blocking=True)
+    b.play(signal[:10], 44100, blocking=True)
+    assert len(b.played) == 2
+    assert np.array_equal(b.played[0], signal)
+    assert np.array_equal(b.played[1], signal[:10])
+    assert b.stats['blocks'] == 12
+    assert b.stats['samples'] == 1060
+
+def test_throughput_without_realtime ():
+
+    b = backends.nullBackend(realtime=False, record=False)
+    b.play(np.zeros(10 * 44100), 44100, blocking=True)
+    assert b.stats['samples'] == 10 * 44100
+    assert b.played == []
+    # ten seconds of audio are consumed far faster than real time
+    assert b.throughput() > 10 * 44100
+    assert b.stats['underruns'] == 0
+
+def test_realtime_pacing ():
+
+    rate, blockSize = 8000, 400
+    b = backends.nullBackend(realtime=True, blockSize=blockSize)
+    start = perf_counter()
+    b.play(np.zeros(rate // 4), rate, blocking=True)
+    elapsed = perf_counter() - start
+
+    # the last block is handed out one block before the end of the signal
+    assert elapsed >= 0.25 - blockSize / rate - 0.01
+    assert b.stats['underruns'] == 0
+    assert len(b.stats['latency']) == 1 and b.stats['latency'][0] >= 0
+
+def test_realtime_underruns ():
+
+    rate, blockSize = 8000, 80
+    b = backends.nullBackend(realtime=True, blockSize=blockSize, callback=lambda block: sleep(0.02))
+    b.play(np.zeros(5 * blockSize), rate, blocking=True)
+    assert b.stats['blocks'] == 5
+    assert b.stats['underruns'] > 0
+    assert b.stats['maxLateness'] > 0
+
+def test_stop_non_blocking_playback ():
+
+    rate = 8000
+    b = backends.nullBackend(realtime=True, blockSize=80)
+    b.play(np.zeros(10 * rate), rate)
+    sleep(0.05)
+    assert b.thread.is_alive()
+    b.stop()
+    assert b.thread is None
+    assert 0 < b.played[0].shape[0] < 10 * rate
+
+    # the backend is usable again after a stop
+    b.play(np.ones(160), rate, blocking=True)
+    assert np.array_equal(b.played[-1], np.ones(160))
+
+def test_default_falls_back_without_output_device (monkeypatch):
+
+    class noOutput:
+        def query_devices (kind=None):
+            raise ValueError('no output device')
+
+    monkeypatch.setattr(backends, 'sd', noOutput)
+    assert isinstance(backends.default(), backends.nullBackend)
+    monkeypatch.setattr(backends, 'sd', None)
+    assert isinstance(backends.default(), backends.nullBackend)
+
+def test_sound_set_backend (monkeypatch):
+
+    b = backends.nullBackend(realtime=False)
+    monkeypatch.setattr(sound, 'backend', sound.backend)
+    sound.setBackend(b)
+    assert sound.backend is b
+    assert b.sampleRate == time.sampleRate
+
+    sound.play(np.arange(5.), blocking=True)
+    assert np.array_equal(b.played[0], np.arange(5.))
@@ -0,0 +1,120 @@
+import random
+import numpy as np
+from fractions import Fraction
+from math import ceil, floor
+from soundprism.signal import clockStream
+
+
+rate = 44100
+
+
+def stream (clock, total, changes, blockSize=1 << 16):
+
+    '''
+    Reads total samples, applying changes {block index: (frequency, pulseWidth)}
+    and returns the rising and falling edge positions plus the sample
+    positions at which each change was scheduled.
+    '''
+
+    rising, falling, scheduled = [], [], []
+    previous = clock.low
+    for i, start in enumerate(range(0, total, blockSize)):
+        if i in changes:
+            clock.set(*changes[i])
+            scheduled.append((clock.samples,) + clock.pending)
+        block = clock.read(min(blockSize, total - start))
+        levels = np.concatenate(([previous], block))
+        high = levels == clock.high
+        rising.append(np.flatnonzero(high[1:] & ~high[:-1]) + start)
+        falling.append(np.flatnonzero(~high[1:] & high[:-1]) + start)
+        previous = block[-1]
+    return np.concatenate(rising), np.concatenate(falling), scheduled
+
+def idealEdges (frequency, pulseWidth, total, scheduled):
+
+    '''
+    Exact edge positions of an ideal pulse train whose parameters switch
+    at the first period starting after the sample they were set at.
+    Returns (rising, falling, ideal rising times, ideal falling times).
+    '''
+
+    rising, falling = [], []
+    start = Fraction(0)
+    segments = list(scheduled) + [(None, None, None)]
+    for m, nextFrequency, nextPulseWidth in segments:
+        period = Fraction(rate) / frequency
+        if m is None:
+            count = ceil((total - start) / period)
+        else:
+            count = floor((m - start) / period) + 1
+        base = floor(start)
+        offsets = float(start - base) + np.arange(count) * float(period)
+        rising.append(base + offsets)
+        falling.append(base + offsets + float(pulseWidth * period))
+        start += count * period
+        frequency, pulseWidth = nextFrequency, nextPulseWidth
+    rising, falling = np.concatenate(rising), np.concatenate(falling)
+    return rising[rising < total], falling[falling < total]
+
+def assertEdges (detected, ideal):
+
+    expected = np.ceil(ideal).astype(np.int64)
+    assert detected.shape == expected.shape
+
+    # an ideal edge within a hair of a sample may round either way
+    mismatch = detected != expected
+    ambiguous = np.abs(ideal - np.round(ideal)) < 1e-6
+    assert np.all(~mismatch | ambiguous)
+    assert np.all(np.abs(detected - expected) <= 1)
+
+
+def test_constant_clock_has_no_drift ():
+
+    total = rate * 3600
+    rising, falling, _ = stream(clockStream(50, 0.1, rate), total, {})
+    ideal = idealEdges(Fraction(50), Fraction(1, 10), total, [])
+    assert rising.shape[0] == 50 * 3600
+    assertEdges(rising, ideal[0])
+    assertEdges(falling, ideal[1])
+
+def test_changing_clock_has_no_drift_over_hours ():
+
+    generator = random.Random(34)
+    total = rate * 2 * 3600
+    blocks = -(-total // (1 << 16))
+    changes = {}
+    for i in range(1, blocks, 8):
+        kind = generator.choice(('both', 'frequency', 'pulseWidth'))
+        frequency = generator.uniform(40, 400) if kind != 'pulseWidth' else None
+        pulseWidth = generator.uniform(0.1, 0.9) if kind != 'frequency' else None
+        changes[i] = (frequency, pulseWidth)
+
+    clock = clockStream(50, 0.1, rate)
+    rising, falling, scheduled = stream(clock, total, changes)
+    ideal = idealEdges(Fraction(50), Fraction(1, 10), total, scheduled)
+
+    assert len(scheduled) > 500
+    assertEdges(rising, ideal[0])
+    assertEdges(falling, ideal[1])
+
+def test_state_stays_in_int64 ():
+
+    generator = random.Random(0)
+    clock = clockStream(50, 0.1, rate)
+    for _ in range(1000):
+        clock.set(frequency=generator.uniform(40, 400), pulseWidth=generator.uniform(0.1, 0.9))
+        clock.read(4096)
+    assert clock.cycle < 1 << 62 and clock.increment < 1 << 62
+    assert 0 <= clock.phase < clock.cycle
+
+def test_changes_wait_for_the_period_boundary ():
+
+    clock = clockStream(50, 0.5, rate)
+    head = clock.read(100)
+    clock.set(frequency=100, pulseWidth=0.25)
+    signal = np.concatenate((head, clock.read(5000)))
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0.], signal))) > 0)
+    assert list(edges[:4]) == [0, 882, 1323, 1764]
+    assert signal[:441].sum() == 441 and signal[441:882].sum() == 0
+    assert signal[882:882+441].sum() == ceil(441 / 4)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from soundprism.signal import generator, time
+from soundprism.vst import keyBoard
+
+
+frequencies = np.array([55., 110., 220., 440., 523.25, 880., 1000.])
+t = time.line(0.5)
+
+def perFrequency (gen):
+
+    return np.stack([gen(f, t) for f in frequencies])
+
+@pytest.mark.parametrize('gen', [generator.sine, generator.saw, generator.parabola, generator.clock])
+def test_built_ins_match_per_frequency_calls (gen):
+
+    assert gen in generator.broadcastable
+    bank = generator.bank(gen, frequencies, t, rows=3, columns=1000)
+    assert np.allclose(bank, perFrequency(gen))
+
+def test_broadcastable_lambda ():
+
+    gen = lambda f, t: generator.sine(f, t) * 0.5 + generator.saw(2 * f, t)
+    assert generator.broadcasts(gen, frequencies, t)
+    assert np.allclose(generator.bank(gen, frequencies, t, rows=4, columns=1000), perFrequency(gen))
+
+def test_reduction_falls_back_to_per_frequency_calls ():
+
+    gen = lambda f, t: generator.sine(f, t) / np.max(f)
+    assert not generator.broadcasts(gen, frequencies, t)
+    assert np.allclose(generator.bank(gen, frequencies, t, rows=4, columns=1000), perFrequency(gen))
+
+def test_length_dependent_lambda_is_not_tiled_over_time ():
+
+    gen = lambda f, t: generator.sine(f, t) * np.exp(-3 * np.linspace(0, 1, t.shape[0]))
+    bank = generator.bank(gen, frequencies, t, rows=4, columns=1000)
+    assert 1000 < t.shape[0]
+    assert np.allclose(bank, perFrequency(gen))
+
+def test_keyboard_bakes_length_dependent_generators ():
+
+    gen = lambda f, t: generator.sine(f, t) * np.exp(-3 * np.linspace(0, 1, t.shape[0]))
+    k = keyBoard()
+    k.toneDuration = 0.5
+    k.applyGenerator(gen)
+    timeline = time.line(0.5)
+    assert timeline.shape[0] > k.tileShape[1]
+    assert np.allclose(k.keyTones['A4'], gen(k.toneRate['A4'], timeline))
@@ -0,0 +1,55 @@
+import numpy as np
+from soundprism.signal import limiter
+
+
+def run (signal, blockSize, **kwargs):
+
+    l = limiter(**kwargs)
+    parts = [l.push(signal[i:i+blockSize]) for i in range(0, signal.shape[0], blockSize)]
+    parts.append(l.flush())
+    return l, np.concatenate(parts)
+
+def loud (n=20000, seed=29):
+
+    rng = np.random.default_rng(seed)
+    signal = rng.standard_normal(n) * 0.3
+    signal[rng.integers(0, n, 40)] *= 12
+    return signal
+
+def test_ceiling_holds_without_the_final_clip (monkeypatch):
+
+    signal = loud()
+    monkeypatch.setattr(np, 'clip', lambda x, *args, **kwargs: x)
+    _, out = run(signal, 1000, ceiling=0.8, lookahead=0.002)
+    assert np.abs(signal).max() > 3
+    assert np.abs(out).max() <= 0.8 + 1e-12
+
+def test_quiet_input_passes_through_delayed ():
+
+    signal = np.sin(np.linspace(0, 200, 5000)) * 0.5
+    l, out = run(signal, 512, ceiling=1.0, lookahead=0.003)
+    delay = l.length - 1
+    assert delay > 0
+    assert out.shape[0] == signal.shape[0] + delay
+    assert np.array_equal(out[:delay], np.zeros(delay))
+    assert np.allclose(out[delay:], signal)
+
+def test_block_size_does_not_matter ():
+
+    signal = loud()
+    _, reference = run(signal, signal.shape[0], ceiling=0.9, lookahead=0.005)
+    for blockSize in (1, 37, 256, 4096):
+        _, out = run(signal, blockSize, ceiling=0.9, lookahead=0.005)
+        assert np.allclose(out, reference, rtol=0, atol=1e-9)
+
+def test_flush_releases_the_tail ():
+
+    l = limiter(lookahead=0.002)
+    signal = np.full(300, 0.25)
+    head = l.push(signal)
+    tail = l.flush()
+    assert head.shape[0] == 300 and tail.shape[0] == l.length - 1
+    assert np.allclose(np.concatenate((head, tail))[l.length - 1:], signal)
+
+    # the limiter starts over from silence after a flush
+    assert np.array_equal(l.push(signal)[:l.length - 1], np.zeros(l.length - 1))
@@ -0,0 +1,47 @@
+import wave
+import pytest
+from soundprism import midi
+from soundprism.signal import generator
+
+
+def variableLength (n):
+
+    out = [n & 0x7F]
+    n >>= 7
+    while n:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    return bytes(reversed(out))
+
+def writeSong (path, note=60):
+
+    track = variableLength(0) + bytes([0x90, note, 100]) + variableLength(480) + bytes([0x80, note, 0])
+    track += variableLength(0) + bytes([0xFF, 0x2F, 0])
+    data = b'MThd' + (6).to_bytes(4, 'big') + bytes([0, 0, 0, 1, 1, 0xE0])
+    data += b'MTrk' + len(track).to_bytes(4, 'big') + track
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_read_maps_notes_to_tone_names (tmp_path):
+
+    notes = midi.load(writeSong(tmp_path / 's.mid'))
+    assert [(n.start, n.duration, n.tone) for n in notes] == [(0., 0.5, 'C4')]
+
+def test_batch_keeps_same_named_files_apart (tmp_path):
+
+    paths = [writeSong(tmp_path / 'x' / 's.mid', 60), writeSong(tmp_path / 'y' / 's.mid', 64)]
+    report = midi.batch(paths, tmp_path / 'out', generator.sine, processes=2, toneDuration=1)
+
+    outputs = sorted(r[1] for r in report['files'])
+    assert outputs == [str(tmp_path / 'out' / 'x' / 's.wav'), str(tmp_path / 'out' / 'y' / 's.wav')]
+    for out in outputs:
+        with wave.open(out) as f:
+            assert f.getnframes() > 0
+
+def test_batch_refuses_colliding_outputs (tmp_path):
+
+    paths = [writeSong(tmp_path / 's.mid'), writeSong(tmp_path / 's.midi')]
+    with pytest.raises(ValueError):
+        midi.batch(paths, tmp_path / 'out', generator.sine, processes=1, toneDuration=1)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from soundprism.signal import scale
+
+
+def test_extrema_propagates_nan ():
+
+    signal = np.arange(10.)
+    signal[3] = np.nan
+    sig_min, sig_max = scale.extrema(signal, blockSize=4)
+    assert np.isnan(sig_min) and np.isnan(sig_max)
+
+def test_amplitude_range_rejects_nan ():
+
+    with pytest.raises(ValueError):
+        scale.normalize(np.array([0., np.nan, 1.]))
+
+def test_amplitude_range_in_place ():
+
+    signal = np.array([-2., 0., 2.])
+    out = scale.amplitudeRange(signal, -1, 1, inplace=True)
+    assert out is signal
+    assert np.allclose(signal, [-1., 0., 1.])
+
+def test_in_place_rejects_integer_signals ():
+
+    with pytest.raises(ValueError):
+        scale.normalize(np.arange(4), inplace=True)
+
+def test_constant_signal_maps_onto_min ():
+
+    assert np.array_equal(scale.amplitudeRange(np.ones(3), 2, 5), [2., 2., 2.])
+
+def test_scaling_runs_block_by_block (monkeypatch):
+
+    monkeypatch.setattr(scale, 'blockSize', 7)
+    signal = np.random.default_rng(29).standard_normal(100)
+    expected = (signal - signal.min()) / (signal.max() - signal.min())
+    assert np.allclose(scale.normalize(signal), expected)
+    assert np.allclose(scale.normalize(np.arange(20)), np.arange(20) / 19)
+
+    out = np.empty(100)
+    assert scale.normalize(signal, out=out) is out
+    assert np.allclose(out, expected)
@@ -0,0 +1,118 @@
+import tempfile
+import threading
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from pathlib import Path
+from soundprism.service import client, fetch, localClient, serve
+
+
+score = [[0, 0.1, 'C4', 100], [0.05, 0.1, 'E4', 90]]
+
+def job (format='shm', generator='sine', **extra):
+
+    return dict(generator=generator, score=score, format=format, toneDuration=0.2, **extra)
+
+
+@pytest.fixture
+def local (tmp_path):
+
+    c = localClient(workers=1, outDir=tmp_path)
+    yield c
+    c.shutdown()
+
+
+def test_jobs_run_in_priority_order (local):
+
+    ids = [local.submit(job(), priority=p) for p in (-10, 3, 1, 2)]
+    for id in ids:
+        assert local.result(id, timeout=60)['status'] == 'done'
+    assert list(local.service.finished) == [ids[0], ids[2], ids[3], ids[1]]
+
+def test_shm_and_wav_results (local):
+
+    shm = local.result(local.submit(job('shm')), timeout=60)['result']
+    wav = local.result(local.submit(job('wav')), timeout=60)['result']
+
+    a, b = fetch(shm), fetch(wav)
+    assert shm['samples'] == a.shape[0] == b.shape[0]
+    assert np.max(np.abs(a)) > 0
+    assert np.allclose(a, b, atol=1e-4)
+    assert Path(wav['path']).exists()
+
+def test_metrics_count_jobs (local):
+
+    local.result(local.submit(job()), timeout=60)
+    failed = local.submit(dict(job(), score=[[0, 1, 'Q9', 1]]))
+    assert local.result(failed, timeout=60)['status'] == 'failed'
+
+    metrics = local.metrics()
+    assert metrics['submitted'] == 2
+    assert metrics['completed'] == 1 and metrics['failed'] == 1
+    assert metrics['queueDepth'] == 0
+    assert metrics['audioSeconds'] > 0 and metrics['throughput'] > 0
+
+def test_rejects_non_numeric_priority (local):
+
+    with pytest.raises(ValueError):
+        local.submit(job(), priority='high')
+    for priority in ('nan', float('inf'), float('-inf')):
+        with pytest.raises(ValueError):
+            local.submit(job(), priority=priority)
+    assert local.metrics()['submitted'] == 0
+
+def test_release_unlinks_shared_memory (local):
+
+    result = local.result(local.submit(job()), timeout=60)['result']
+    id = local.submit(job())
+    local.result(id, timeout=60)
+    assert local.release(0)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=result['name'])
+    with pytest.raises(KeyError):
+        local.result(0)
+
+def test_retention_limit_releases_oldest (tmp_path):
+
+    c = localClient(workers=1, outDir=tmp_path, retain=1)
+    first = c.result(c.submit(job()), timeout=60)['result']
+    c.result(c.submit(job()), timeout=60)
+    assert len(c.service.jobs) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=first['name'])
+    c.shutdown()
+
+def test_evicted_instruments_drop_their_bake_lock (tmp_path):
+
+    c = localClient(workers=1, outDir=tmp_path, cacheSize=1)
+    for generator in ('sine', 'saw', 'parabola'):
+        c.result(c.submit(job(generator=generator)), timeout=60)
+    assert len(c.service.keyboards) == len(c.service.bakeLocks) == 1
+    c.shutdown()
+
+def test_unix_socket_round_trip ():
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = str(Path(directory) / 'sp.sock')
+        ready = threading.Event()
+        daemon = threading.Thread(target=serve, args=(address,), kwargs={'workers': 1, 'outDir': directory}, daemon=True)
+        daemon.start()
+        for _ in range(100):
+            if Path(address).exists():
+                break
+            ready.wait(0.05)
+
+        render = client(address)
+        id = render.submit(job(), priority=1)
+        record = render.result(id, timeout=60)
+        assert record['status'] == 'done'
+        assert fetch(record['result']).shape[0] == record['result']['samples']
+        assert render.metrics()['completed'] == 1
+        assert render.release(id)
+        with pytest.raises(RuntimeError):
+            render.submit(job(), priority='high')
+
+        render.shutdown()
+        render.close()
+        daemon.join(10)
+        assert not daemon.is_alive()
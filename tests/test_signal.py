@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from soundprism.signal import Signal, combine, plot, scale
+
+
+def test_slices_are_views_with_offsets ():
+
+    s = Signal(np.arange(100.), sampleRate=10, start=1.)
+    part = s[20:50]
+    assert isinstance(part, Signal)
+    assert np.shares_memory(part.data, s.data)
+    assert part.start == 3. and part.sampleRate == 10
+    assert np.allclose(part.timeline, 3. + np.arange(30) / 10)
+
+    # strided slices keep the offset and lower the rate
+    every = s[10::2]
+    assert every.start == 2. and every.sampleRate == 5
+
+    part[0] = -1.
+    assert s.data[20] == -1.
+
+def test_between_uses_absolute_times ():
+
+    s = Signal(np.arange(100.), sampleRate=10, start=1.)
+    part = s.between(3., 5.)
+    assert np.shares_memory(part.data, s.data)
+    assert part.start == 3. and len(part) == 20
+    assert np.array_equal(part.data, np.arange(20., 40.))
+    assert len(s.between(stop=0.5)) == 0
+    assert s.between(9.).end == s.end
+
+def test_ufuncs_keep_rate_and_offset ():
+
+    s = Signal(np.ones(4), sampleRate=8000, start=0.5)
+    result = np.sin(s) * 2 + s
+    assert isinstance(result, Signal)
+    assert result.sampleRate == 8000 and result.start == 0.5
+
+def test_mixed_sample_rates_raise ():
+
+    a, b = Signal(np.ones(4), sampleRate=8000), Signal(np.ones(4), sampleRate=44100)
+    with pytest.raises(ValueError):
+        a + b
+    with pytest.raises(ValueError):
+        combine(a, b)
+
+def test_combine_takes_the_offset_of_the_main_signal ():
+
+    short, long = Signal(np.ones(3), start=2.), Signal(np.ones(5), start=0.)
+    for result in (combine(short, long), combine(long, short)):
+        assert isinstance(result, Signal)
+        assert len(result) == 5 and result.start == 0.
+        assert np.array_equal(result.data, [2., 2., 2., 1., 1.])
+    assert combine(np.ones(5), Signal(np.ones(3), start=2.)).start == 0.
+
+def test_scale_accepts_signals ():
+
+    s = Signal(np.array([-2., 0., 2.]), sampleRate=8000, start=1.)
+    out = scale.normalize(s)
+    assert isinstance(out, Signal)
+    assert out.sampleRate == 8000 and out.start == 1.
+    assert np.allclose(out.data, [0., .5, 1.])
+    assert scale.extrema(s) == (-2., 2.)
+
+    scale.normalize(s, inplace=True)
+    assert np.allclose(s.data, [0., .5, 1.])
+
+def test_plot_accepts_signals (tmp_path):
+
+    s = Signal(np.sin(np.linspace(0, 20, 800)), sampleRate=400, start=3.)
+    path = tmp_path / 'signal.png'
+    plot(s, start=0.5, stop=1.5, savepath=path, show=False)
+    assert path.stat().st_size > 0
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from soundprism import spectral
+
+
+@pytest.mark.parametrize('n', [5, 2048, 3000, 100000])
+@pytest.mark.parametrize('frameSize, hopSize', [(2048, 512), (1024, 256), (1000, 300)])
+def test_round_trip_keeps_every_sample (n, frameSize, hopSize):
+
+    x = np.random.default_rng(0).standard_normal(n)
+    spectra = list(spectral.stft(x, frameSize, hopSize, blockSize=7777))
+    y = spectral.istft(spectra, frameSize, hopSize, length=n)
+
+    assert y.shape == x.shape
+    assert np.allclose(x, y, atol=1e-8)
+    assert sum(s.shape[0] for s in spectra) == spectral.analyzer(frameSize, hopSize).frameCount(n)
+
+def test_windows_are_periodic ():
+
+    w = spectral.windows.get('hann', 8)
+    assert np.allclose(w, np.hanning(9)[:-1])
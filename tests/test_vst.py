@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+import threading
+from time import sleep
+from soundprism.signal import generator, time
+from soundprism.vst import keyBoard
+
+
+class counting:
+
+    '''
+    Sine generator which counts its calls and can be held or slowed down.
+    '''
+
+    def __init__ (self, delay=0., gate=None):
+
+        self.calls = 0
+        self.delay = delay
+        self.gate = gate
+
+    def __call__ (self, f, t):
+
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait()
+        sleep(self.delay)
+        return generator.sine(f, t)
+
+
+def keyboard (gen):
+
+    k = keyBoard()
+    k.toneDuration = 0.05
+    k.applyGenerator(gen)
+    return k
+
+def test_old_tones_stay_playable_until_replaced ():
+
+    k = keyboard(generator.saw)
+    old = dict(k.keyTones)
+
+    gate = threading.Event()
+    k.applyGenerator(counting(gate=gate), background=True)
+    assert k.isBaking()
+    for tone in k.toneRate:
+        assert k.keyTones[tone] is old[tone]
+    k.synth('A4', playSound=False)
+
+    gate.set()
+    k.waitForBake()
+    assert not k.isBaking()
+    timeline = time.line(k.toneDuration)
+    for tone in k.toneRate:
+        assert np.allclose(k.keyTones[tone], generator.sine(k.toneRate[tone], timeline))
+
+def test_amplification_only_refresh_never_calls_the_generator ():
+
+    gen = counting()
+    k = keyboard(gen)
+    calls, old = gen.calls, dict(k.keyTones)
+
+    k.amplification = 0.25
+    assert k.refresh()
+    assert gen.calls == calls
+    for tone in k.toneRate:
+        assert np.allclose(k.keyTones[tone], old[tone] * 0.25)
+        # replaced, never written in place
+        assert k.keyTones[tone] is not old[tone]
+
+def test_newer_bake_cancels_a_running_one ():
+
+    slow, fast = counting(delay=0.02), counting()
+    k = keyboard(generator.saw)
+    k.applyGenerator(slow, background=True)
+    while slow.calls == 0:
+        sleep(0.001)
+    k.applyGenerator(fast, background=True)
+    k.waitForBake()
+
+    groups = -(-len(k.toneRate) // k.tileShape[0])
+    assert slow.calls < groups
+    assert all(k.bakedWith[tone][0] is fast for tone in k.toneRate)
+
+def test_changing_the_tone_duration_rebakes ():
+
+    gen = counting()
+    k = keyboard(gen)
+    calls = gen.calls
+
+    k.toneDuration = 0.1
+    assert k.refresh(background=True)
+    k.waitForBake()
+    assert gen.calls > calls
+    assert all(k.keyTones[tone].shape[0] == time.line(0.1).shape[0] for tone in k.toneRate)
+
+def test_background_errors_are_raised_by_wait_for_bake ():
+
+    def broken (f, t):
+        raise RuntimeError('broken generator')
+
+    k = keyboard(generator.sine)
+    old = dict(k.keyTones)
+    k.applyGenerator(broken, background=True)
+    with pytest.raises(RuntimeError, match='broken generator'):
+        k.waitForBake()
+    assert not k.isBaking()
+    assert all(k.keyTones[tone] is old[tone] for tone in k.toneRate)
+
+    # reported once
+    k.waitForBake()
+
+def test_priority_follows_the_bound_octaves ():
+
+    k = keyBoard()
+    k.bindTonesToKeyboard(level=2)
+    order = k.keyPriority()
+    bound = set(k.pianoKeyMap.values())
+    assert set(order[:len(bound)]) == bound
+    levels = [int(tone[1]) for tone in order[len(bound):]]
+    distance = [min(abs(l - 2), abs(l - 3)) for l in levels]
+    assert distance == sorted(distance)
+    assert levels[0] in (1, 4)